@@ -1,8 +1,24 @@
 import os                        # 環境変数を読む
+import json                      # JSONを読み書きする
+import tempfile                  # 名前のかぶらない一時ファイルをつくる
 import requests                  # Webにアクセスしてデータを送受信する
-from datetime import datetime    # 日付や時刻を扱う
+from requests.adapters import HTTPAdapter  # 接続を使い回す設定
+from datetime import datetime, timedelta, timezone  # 日付や時刻を扱う
+from email.utils import format_datetime  # HTTPヘッダ用の日時文字列をつくる
 from zoneinfo import ZoneInfo    # タイムゾーンを扱う（UTC⇒JSTにする）
 
+# orjson があれば速いほうでJSONを読み書きする（無ければ標準のjsonを使う）
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
 # 設定
 JMA_OFFICE_CODE = os.getenv("JMA_OFFICE_CODE", "400000")  # 福岡県
 TARGET_FORECAST_AREA_NAME = os.getenv("TARGET_FORECAST_AREA_NAME", "福岡地方")
@@ -10,85 +26,149 @@ TARGET_TEMP_AREA_NAME = os.getenv("TARGET_TEMP_AREA_NAME", "福岡")
 LINE_CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
 LINE_GROUP_ID = os.getenv("LINE_GROUP_ID")  # LINEのgroupId
 
+# LINEに送るときのヘッダ（トークンが無いときは None）
+LINE_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}",
+} if LINE_CHANNEL_ACCESS_TOKEN else None
+
+JST = ZoneInfo("Asia/Tokyo")
+JMA_PUBLISH_HOURS = (5, 11, 17)  # 気象庁の定時発表（JST）
+
+# 気象庁JSONの保存先（他のユーザーが書き換えられないよう、自分専用のキャッシュフォルダにする）
+JMA_CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "weather-line-bot",
+)
+
+# 通信はこのSessionを使い回す（気象庁とLINEで接続を再利用する）
+# ※ brotli が入っていれば Accept-Encoding に br も自動で付き、気象庁JSONが圧縮されて届く
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+# 次の発表時刻（05:00/11:00/17:00 JST）を求める
+def next_publication_boundary(dt: datetime) -> datetime:
+    """dt より後で一番近い気象庁の定時発表時刻を返す"""
+    dt = dt.astimezone(JST)
+    for h in JMA_PUBLISH_HOURS:
+        boundary = dt.replace(hour=h, minute=0, second=0, microsecond=0)
+        if boundary > dt:
+            return boundary
+    tomorrow = dt + timedelta(days=1)
+    return tomorrow.replace(hour=JMA_PUBLISH_HOURS[0], minute=0, second=0, microsecond=0)
+
+# 保存しておいた気象庁JSONを読む
+def load_jma_cache(path: str) -> list | None:
+    """読めなければ None（壊れていたら取り直す）"""
+    try:
+        with open(path, "rb") as f:
+            return json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+# 保存済みの気象庁JSONがまだ最新の発表分か
+def is_jma_cache_fresh(jma_json: list, now: datetime) -> bool:
+    """
+    JSON内の発表時刻（reportDatetime）の次の定時発表時刻までは最新とみなす
+    （ファイルの更新日時だと、発表前に取った古い予報を最新と勘違いするため）
+    """
+    try:
+        report_dt = datetime.fromisoformat(jma_json[0]["reportDatetime"])
+    except (LookupError, TypeError, ValueError):
+        return False
+    if report_dt.tzinfo is None:
+        report_dt = report_dt.replace(tzinfo=JST)
+    return now < next_publication_boundary(report_dt)
+
 # 気象庁JSONを取りに行く
 def fetch_jma_forecast(office_code: str) -> list:
+    """
+    保存したJSONの発表時刻から見て次の定時発表前なら、それをそのまま使う。
+    過ぎていたら If-Modified-Since（保存した時刻）付きで取り直し、304 なら保存済みを使う。
+    """
     url = f"https://www.jma.go.jp/bosai/forecast/data/forecast/{office_code}.json"
-    r = requests.get(url, timeout=10)
+    cache_path = os.path.join(JMA_CACHE_DIR, f"jma_{office_code}.json")
+
+    headers = {}
+    cached = None
+    try:
+        mtime = datetime.fromtimestamp(os.path.getmtime(cache_path), JST)
+    except OSError:
+        mtime = None
+    if mtime is not None:
+        cached = load_jma_cache(cache_path)
+    if cached is not None:
+        if is_jma_cache_fresh(cached, datetime.now(JST)):
+            return cached
+        headers["If-Modified-Since"] = format_datetime(mtime.astimezone(timezone.utc), usegmt=True)
+
+    r = SESSION.get(url, headers=headers, timeout=10)
+    if r.status_code == 304 and cached is not None:
+        # 変わっていなかったので、確認した時刻として更新日時を進めておく
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+        return cached
     r.raise_for_status()
-    return r.json()
+    data = json_loads(r.content)
 
-# 取ってきた気象庁JSONの中から「福岡地方」を探す
-def pick_area(areas: list, name: str) -> dict:
-    for a in areas:
+    # 途中で落ちても壊れたファイルが残らないよう、新しい一時ファイルに書いてから置き換える
+    try:
+        os.makedirs(JMA_CACHE_DIR, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=JMA_CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(r.content)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        pass  # 保存できなくても通知は続ける
+    return data
+
+# 取ってきた気象庁JSONの中から「福岡地方」などを探す
+def pick_area(ts: dict, name: str) -> dict:
+    """timeSeries の areas から地域名が一致する最初の要素を返す（area/name の無い要素は無視）"""
+    for a in ts.get("areas", []):
         if a.get("area", {}).get("name") == name:
             return a
     raise ValueError(f"指定した地域名 '{name}' が見つかりませんでした。")
 
-# 天気を絵文字に変換する
-def weather_to_emoji(main_weather: str) -> str:
-    """メイン天気（晴れ/くもり/雨/雪）から絵文字を決める"""
-    if "晴れ" in main_weather:
-        return "☀️"
-    if "くもり" in main_weather:
-        return "☁️"
-    if "雨" in main_weather:
-        return "🌧️"
-    if "雪" in main_weather:
-        return "❄️"
-    return "🌤️"
-
-# 天気の絵文字を〇/△形式で表現する
-def weather_to_emoji_combo(simple_weather: str) -> str:
-    """
-    '晴れのちくもり' のような表現を ☀️/☁️ のように表示する
-    'のち' が無い場合は単体絵文字を返す
-    """
-    parts = [p.strip() for p in simple_weather.split("のち") if p.strip()]
-    emojis = [weather_to_emoji(p) for p in parts]
-    # 同じ絵文字が連続/重複したら1つにする（例: くもりのちくもり）
-    unique = []
-    for e in emojis:
-        if not unique or unique[-1] != e:
-            unique.append(e)
-    return "/".join(unique) if unique else "🌤️"
-
-# 天気文を〇〇のち△△に成形する
-def normalize_weather_text(raw: str) -> str:
+# 天気のキーワードと絵文字（晴れ/くもり/雨/雪）
+WEATHER_KEYWORDS = (("晴れ", "☀️"), ("くもり", "☁️"), ("雨", "🌧️"), ("雪", "❄️"))
+DEFAULT_WEATHER_EMOJI = "🌤️"
+
+# 天気文を〇〇のち△△に成形し、〇/△形式の絵文字もつくる
+def summarize_weather(raw: str) -> tuple[str, str]:
     """
-    気象庁の天気文を「〇〇のち△△」形式へ寄せる
+    気象庁の天気文を「〇〇のち△△」形式へ寄せ、'☀️/☁️' のような絵文字と一緒に返す
+    キーワードごとに最初に出てくる位置を探し、出てきた順に先頭2つを使う
     """
-    t = raw.replace("　", " ").strip()
-    t = t.replace("曇り", "くもり").replace("曇", "くもり")
+    t = raw.replace("　", " ").strip().replace("曇り", "くもり").replace("曇", "くもり")
 
-    keywords = ["晴れ", "くもり", "雨", "雪"]
     positions = []
-    for k in keywords:
+    for k, e in WEATHER_KEYWORDS:
         idx = t.find(k)
         if idx != -1:
-            positions.append((idx, k))
+            positions.append((idx, k, e))
     positions.sort()
-
-    found = []
-    for _, k in positions:
-        if not found or found[-1] != k:
-            found.append(k)
+    found = positions[:2]
 
     if not found:
-        return raw.strip()
-    if len(found) == 1:
-        return found[0]
-    return f"{found[0]}のち{found[1]}"
+        return raw.strip(), DEFAULT_WEATHER_EMOJI
+    return "のち".join(k for _, k, _ in found), "/".join(e for _, _, e in found)
 
 # 今日の降水確率を時間帯ごとで区切る
-def pops_fixed_buckets_today(ts_pop: dict, area_name: str, now_jst: datetime) -> dict[str, int | None]:
+def pops_fixed_buckets_today(ts_pop: dict, area_pop: dict, now_jst: datetime) -> dict[str, int | None]:
     """
-    気象庁の降水確率 timeSeries[1] から「今日」の分だけを集め、
+    気象庁の降水確率の timeSeries から「今日」の分だけを集め、
     00:00-06:00 / 06:00-12:00 / 12:00-18:00 / 18:00-24:00 の4区間に当てはめる。
     取れない区間は None のまま。
     
-    ※ timeSeries[1] は発表時刻によって要素数・含む時間帯が変わるため、欠ける区間があり得る。
+    ※ 降水確率の timeSeries は発表時刻によって要素数・含む時間帯が変わるため、欠ける区間があり得る。
     """
-    area_pop = pick_area(ts_pop["areas"], area_name)
     pops = area_pop.get("pops", [])
     time_defines = ts_pop.get("timeDefines", [])
 
@@ -124,8 +204,8 @@ def pops_fixed_buckets_today(ts_pop: dict, area_name: str, now_jst: datetime) ->
         if start.date() != today:
             continue
 
-        sh = start.strftime("%H")
-        eh = end.strftime("%H")
+        sh = f"{start.hour:02d}:{start.minute:02d}"
+        eh = f"{end.hour:02d}:{end.minute:02d}"
         if eh == "00:00":
             eh = "24:00"
 
@@ -153,8 +233,7 @@ def format_buckets_block_filtered(
     order = all_order if show_past else ["06:00-12:00", "12:00-18:00", "18:00-24:00"]
 
     # 最大値は「表示対象の区間」だけで計算
-    vals = [buckets.get(k) for k in order if isinstance(buckets.get(k), int)]
-    max_pop = max(vals) if vals else None
+    max_pop = max((buckets[k] for k in order if isinstance(buckets.get(k), int)), default=None)
 
     header = f"降水確率：最大{max_pop}%" if max_pop is not None else "降水確率：最大--%"
     sep = "------------------------"
@@ -173,79 +252,78 @@ def build_message(jma_json: list) -> str:
     data0 = jma_json[0]
     publishing_office = data0.get("publishingOffice", "気象庁")
     report_dt = data0.get("reportDatetime", "")
-    now_jst = datetime.now(ZoneInfo("Asia/Tokyo"))    # JST固定
-
-    # 今日の天気（文章）
-    ts_weather = data0["timeSeries"][0]
-    area_weather = pick_area(ts_weather["areas"], TARGET_FORECAST_AREA_NAME)
-    today_weather_text = area_weather["weathers"][0]
-    simple_weather = normalize_weather_text(today_weather_text)
-    emoji = weather_to_emoji_combo(simple_weather)
+    now_jst = datetime.now(JST)    # JST固定
+
+    # timeSeries を中身（weathers/pops/temps）で見分ける（並び順が変わっても、欠けていても動くように）
+    series = {}
+    for ts in data0.get("timeSeries", ()):
+        areas = ts.get("areas") or ()
+        for key in ("weathers", "pops", "temps"):
+            if areas and key in areas[0]:
+                series.setdefault(key, ts)
+    ts_weather = series.get("weathers", {})
+    ts_pop = series.get("pops", {})
+    ts_temp = series.get("temps", {})
+
+    # 「福岡地方」「福岡」を探す（その timeSeries が無ければ空のまま）
+    area_weather = pick_area(ts_weather, TARGET_FORECAST_AREA_NAME) if ts_weather else {}
+    area_pop = pick_area(ts_pop, TARGET_FORECAST_AREA_NAME) if ts_pop else {}
+    area_temp = pick_area(ts_temp, TARGET_TEMP_AREA_NAME) if ts_temp else {}
+
+    # 今日の天気（文章）。無ければ "--" にして、取れた分だけ送る
+    weathers = area_weather.get("weathers", [])
+    if weathers:
+        simple_weather, emoji = summarize_weather(weathers[0])
+    else:
+        simple_weather, emoji = "--", DEFAULT_WEATHER_EMOJI
 
     # 今日の降水（4区間固定でブロック表示）
-    ts_pop = data0["timeSeries"][1]
-    buckets = pops_fixed_buckets_today(ts_pop, TARGET_FORECAST_AREA_NAME, now_jst)
+    buckets = pops_fixed_buckets_today(ts_pop, area_pop, now_jst)
     pop_block, _ = format_buckets_block_filtered(buckets, show_past=False)
 
     # 気温
-    ts_temp = data0["timeSeries"][2]
-    area_temp = pick_area(ts_temp["areas"], TARGET_TEMP_AREA_NAME)
     temps = area_temp.get("temps", [])
     temp_min = temps[0] if len(temps) >= 1 else None
     temp_max = temps[1] if len(temps) >= 2 else None
 
-    # 日付文字列（JST）
-    date_str = now_jst.strftime("%-m/%-d(%a)")
-    dow_map = {"Mon": "月", "Tue": "火", "Wed": "水", "Thu": "木", "Fri": "金", "Sat": "土", "Sun": "日"}
-    if "(" in date_str and ")" in date_str:
-        dow = date_str.split("(")[-1].split(")")[0]
-        date_str = date_str.replace(dow, dow_map.get(dow, dow))
-
-    # 発表時刻
-    report_time = ""
-    try:
-        report_time = report_dt.split("T")[1][:5]
-    except Exception:
-        report_time = report_dt
-
-    # ---- メッセージ組み立て（ここで初めて lines を作る）----
-    lines = []
-    lines.append(f"{emoji} 福岡市 {date_str}")
-    lines.append(f"天気：{simple_weather}")
-    lines.append("")
-
-    if temp_min is not None and temp_max is not None:
-        lines.append(f"気温：{temp_min}℃ / {temp_max}℃")
-
-    # 観測元
-    lines.append(pop_block)
-
-    lines.append("")
-    lines.append(f"発表：{report_time}（{publishing_office}）")
-
+    # 日付文字列（JST）例: 1/5(月)
+    dow = ("月", "火", "水", "木", "金", "土", "日")[now_jst.weekday()]
+    date_str = f"{now_jst.month}/{now_jst.day}({dow})"
+
+    # 発表時刻（"2025-01-01T05:00:00+09:00" の "05:00" 部分）
+    report_time = report_dt[11:16] if len(report_dt) >= 16 and report_dt[10:11] == "T" else report_dt
+
+    # ---- メッセージ組み立て（1つのタプルにまとめて最後に1回だけ join する）----
+    has_temps = temp_min is not None and temp_max is not None
+    lines = (
+        f"{emoji} 福岡市 {date_str}",
+        f"天気：{simple_weather}",
+        "",
+        *((f"気温：{temp_min}℃ / {temp_max}℃",) if has_temps else ()),
+        pop_block,
+        "",
+        f"発表：{report_time}（{publishing_office}）",
+    )
     return "\n".join(lines)
 
 # LINEに送る
 def send_line_to_group(message: str):
-    """LINEグループへPush送信"""
-    if not LINE_CHANNEL_ACCESS_TOKEN or not LINE_GROUP_ID:
-        raise RuntimeError("LINE_CHANNEL_ACCESS_TOKEN と LINE_GROUP_ID を設定してください。")
-
+    """LINEグループへPush送信（設定のチェックは main で済ませておく）"""
     url = "https://api.line.me/v2/bot/message/push"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}",
-    }
     payload = {
         "to": LINE_GROUP_ID,
         "messages": [{"type": "text", "text": message}],
     }
 
-    r = requests.post(url, headers=headers, json=payload, timeout=10)
+    r = SESSION.post(url, headers=LINE_HEADERS, data=json_dumps(payload), timeout=10)
     r.raise_for_status()
 
 # main処理
 def main():
+    # 設定が足りないなら、気象庁に取りに行く前に止める
+    if not LINE_CHANNEL_ACCESS_TOKEN or not LINE_GROUP_ID:
+        raise RuntimeError("LINE_CHANNEL_ACCESS_TOKEN と LINE_GROUP_ID を設定してください。")
+
     jma = fetch_jma_forecast(JMA_OFFICE_CODE)    # 天気を取る
     msg = build_message(jma)                     # メッセージをつくる
     send_line_to_group(msg)                      # LINEに送る